@@ -0,0 +1,279 @@
+"""Shared Gemini REST client.
+
+One pooled keep-alive session per worker process (optionally HTTP/2 through
+httpx), the safety settings and generation presets the endpoints share,
+uniform candidate-text extraction, and per-call latency/status metrics.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_MODEL_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash"
+
+SAFETY_SETTINGS = [
+	{"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+	{"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+	{"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+	{"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+]
+
+_JSON_OUTPUT = {"responseMimeType": "application/json"}
+
+# generationConfig per use case; callers may override individual keys
+GENERATION_PRESETS = {
+	"chat": {"temperature": 0.9, "topK": 50, "topP": 0.95, "maxOutputTokens": 1024},
+	"facial_features": {"temperature": 0.3, "topK": 40, "topP": 0.95, "maxOutputTokens": 1024},
+	"photo_description": {"temperature": 0.8, "topK": 40, "topP": 0.95, "maxOutputTokens": 64},
+	"photo_analysis": {"temperature": 0.4, "topK": 40, "topP": 0.95, "maxOutputTokens": 1024, **_JSON_OUTPUT},
+	"wellness": {"temperature": 1.0, "topK": 40, "topP": 0.9, "maxOutputTokens": 800},
+	"diet_plan": {"temperature": 0.5, "topP": 0.9, "topK": 40, "maxOutputTokens": 1200, **_JSON_OUTPUT},
+	"hospitals": {"temperature": 0.3, "topP": 0.9, "topK": 40, "maxOutputTokens": 800, **_JSON_OUTPUT},
+}
+
+
+class GeminiError(Exception):
+	"""A Gemini call that failed: transport error, non-2xx status or undecodable body."""
+
+	def __init__(self, message: str, status=None, body: str = ""):
+		super().__init__(message)
+		self.status = status
+		self.body = body
+
+
+def text_part(text: str) -> dict:
+	return {"text": text}
+
+
+def image_part(base64_data: str, mime_type: str = "image/jpeg") -> dict:
+	return {"inline_data": {"mime_type": mime_type, "data": base64_data}}
+
+
+def candidate_text(result) -> str:
+	"""Text of the first candidate, with all of its text parts joined ("" if there is none)."""
+	try:
+		parts = (result.get("candidates") or [{}])[0].get("content", {}).get("parts") or []
+		return "".join(p.get("text", "") for p in parts if isinstance(p, dict))
+	except (AttributeError, IndexError, TypeError):
+		return ""
+
+
+class GeminiMetrics:
+	"""Per-call-name counters: calls, status codes, errors and latency percentiles."""
+
+	def __init__(self, window: int = 512):
+		self._window = window
+		self._lock = threading.Lock()
+		self._calls = {}
+
+	def record(self, name: str, status, elapsed_ms: float):
+		with self._lock:
+			st = self._calls.get(name)
+			if st is None:
+				st = self._calls[name] = {
+					"calls": 0, "errors": 0, "statuses": {}, "total_ms": 0.0, "max_ms": 0.0,
+					"recent": deque(maxlen=self._window),
+				}
+			st["calls"] += 1
+			key = str(status)
+			st["statuses"][key] = st["statuses"].get(key, 0) + 1
+			if not (isinstance(status, int) and 200 <= status < 300):
+				st["errors"] += 1
+			st["total_ms"] += elapsed_ms
+			st["max_ms"] = max(st["max_ms"], elapsed_ms)
+			st["recent"].append(elapsed_ms)
+
+	def snapshot(self) -> dict:
+		with self._lock:
+			out = {}
+			for name, st in self._calls.items():
+				recent = sorted(st["recent"])
+				out[name] = {
+					"calls": st["calls"],
+					"errors": st["errors"],
+					"statuses": dict(st["statuses"]),
+					"avg_ms": round(st["total_ms"] / st["calls"], 1) if st["calls"] else 0.0,
+					"p50_ms": round(recent[len(recent) // 2], 1) if recent else 0.0,
+					"p95_ms": round(recent[min(len(recent) - 1, int(len(recent) * 0.95))], 1) if recent else 0.0,
+					"max_ms": round(st["max_ms"], 1),
+				}
+			return out
+
+
+class GeminiClient:
+	"""generateContent calls over a pooled keep-alive connection.
+
+	The session is created lazily and re-created after fork, so each worker
+	process keeps its own connection pool. With http2=True and httpx (with
+	the h2 extra) installed, calls go over a single multiplexed HTTP/2
+	connection; otherwise requests/urllib3 with keep-alive is used.
+	"""
+
+	def __init__(self, model_url: str = DEFAULT_MODEL_URL, api_key: str = None, pool_size: int = 10,
+			http2: bool = False, logger=None):
+		self.model_url = model_url.rstrip("/")
+		self._api_key = api_key
+		self.pool_size = pool_size
+		self.http2 = http2
+		self.logger = logger
+		self.metrics = GeminiMetrics()
+		self._lock = threading.Lock()
+		self._session = None
+		self._session_pid = None
+		self._transport = None
+
+	@property
+	def api_key(self):
+		return self._api_key or os.environ.get("GEMINI_API_KEY")
+
+	def _get_session(self):
+		pid = os.getpid()
+		if self._session is None or self._session_pid != pid:
+			with self._lock:
+				if self._session is None or self._session_pid != pid:
+					self._session, self._transport = self._new_session()
+					self._session_pid = pid
+		return self._session
+
+	def _new_session(self):
+		if self.http2:
+			try:
+				import httpx  # type: ignore
+
+				limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+				return httpx.Client(http2=True, limits=limits), "httpx"
+			except ImportError:
+				if self.logger:
+					self.logger.warning("GEMINI_HTTP2 requested but httpx[http2] is not installed; using HTTP/1.1")
+		session = requests.Session()
+		adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+		session.mount("https://", adapter)
+		session.mount("http://", adapter)
+		session.headers.update({"Content-Type": "application/json"})
+		return session, "requests"
+
+	@property
+	def transport(self) -> str:
+		self._get_session()
+		return self._transport
+
+	def build_request(self, parts, preset: str = None, generation_config: dict = None,
+			safety: bool = True, **extra) -> dict:
+		"""Assemble a generateContent body from content parts (or a prompt string)."""
+		if isinstance(parts, str):
+			parts = [text_part(parts)]
+		body = {"contents": [{"parts": list(parts)}]}
+		config = dict(GENERATION_PRESETS.get(preset) or {})
+		if generation_config:
+			config.update(generation_config)
+		if config:
+			body["generationConfig"] = config
+		if safety:
+			body["safetySettings"] = SAFETY_SETTINGS
+		body.update(extra)
+		return body
+
+	def post(self, method: str, body: dict, timeout: float = 30, name: str = None, stream: bool = False):
+		"""POST body to <model>:<method>; returns the raw response of the active transport."""
+		api_key = self.api_key
+		if not api_key:
+			raise GeminiError("Missing GEMINI_API_KEY")
+		session = self._get_session()
+		url = f"{self.model_url}:{method}"
+		params = {"key": api_key}
+		if stream:
+			params["alt"] = "sse"
+		name = name or method
+		started = time.perf_counter()
+		status = "error"
+		try:
+			if self._transport == "httpx":
+				if stream:
+					req = session.build_request("POST", url, params=params, json=body, timeout=timeout)
+					resp = session.send(req, stream=True)
+				else:
+					resp = session.post(url, params=params, json=body, timeout=timeout)
+			else:
+				resp = session.post(url, params=params, json=body, timeout=timeout, stream=stream)
+			status = resp.status_code
+			return resp
+		except Exception as e:
+			# requests and httpx both name their timeout exceptions *Timeout
+			if "Timeout" in type(e).__name__:
+				status = "timeout"
+			raise
+		finally:
+			self.metrics.record(name, status, (time.perf_counter() - started) * 1000.0)
+
+	def generate(self, parts, preset: str = None, generation_config: dict = None, safety: bool = True,
+			timeout: float = 30, name: str = None, **extra) -> dict:
+		"""Call generateContent and return the decoded JSON response.
+
+		Raises GeminiError for transport failures, non-2xx statuses and
+		non-JSON bodies.
+		"""
+		body = self.build_request(parts, preset, generation_config, safety, **extra)
+		try:
+			resp = self.post("generateContent", body, timeout=timeout, name=name or preset)
+		except GeminiError:
+			raise
+		except Exception as e:
+			raise GeminiError(f"Gemini request failed: {e}") from e
+		if not (200 <= resp.status_code < 300):
+			raise GeminiError(f"Gemini API error: {resp.status_code}", status=resp.status_code, body=resp.text)
+		try:
+			return resp.json() or {}
+		except ValueError as e:
+			raise GeminiError("Gemini returned a non-JSON body", status=resp.status_code, body=resp.text[:500]) from e
+
+	def generate_text(self, parts, **kwargs) -> str:
+		"""generate() and return the first candidate's text ("" if none)."""
+		return candidate_text(self.generate(parts, **kwargs))
+
+	def stream_generate(self, parts, preset: str = None, generation_config: dict = None, safety: bool = True,
+			timeout: float = 30, name: str = None, **extra):
+		"""Call streamGenerateContent (SSE) and return an iterator of text deltas.
+
+		The request is made and its status checked before this returns, so
+		GeminiError is raised up front; close() the iterator to release the
+		connection early.
+		"""
+		body = self.build_request(parts, preset, generation_config, safety, **extra)
+		try:
+			resp = self.post("streamGenerateContent", body, timeout=timeout, name=name or preset, stream=True)
+		except GeminiError:
+			raise
+		except Exception as e:
+			raise GeminiError(f"Gemini request failed: {e}") from e
+		if not (200 <= resp.status_code < 300):
+			try:
+				err_body = resp.read().decode("utf-8", "replace") if self._transport == "httpx" else resp.text
+			finally:
+				resp.close()
+			raise GeminiError(f"Gemini API error: {resp.status_code}", status=resp.status_code, body=err_body)
+		return self._iter_sse_text(resp)
+
+	@staticmethod
+	def _iter_sse_text(resp):
+		try:
+			for line in resp.iter_lines():
+				if isinstance(line, bytes):
+					line = line.decode("utf-8")
+				if not line.startswith("data:"):
+					continue
+				try:
+					chunk = json.loads(line[5:].strip())
+				except ValueError:
+					continue
+				text = candidate_text(chunk)
+				if text:
+					yield text
+		finally:
+			resp.close()
+
+	def stats(self) -> dict:
+		return {"transport": self._transport, "pool_size": self.pool_size, "calls": self.metrics.snapshot()}
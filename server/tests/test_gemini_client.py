@@ -0,0 +1,216 @@
+"""GeminiClient against a local stand-in for the generateContent REST API."""
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gemini_client import SAFETY_SETTINGS, GeminiClient, GeminiError, GeminiMetrics, candidate_text  # noqa: E402
+
+
+def _candidate(*texts):
+	return {"candidates": [{"content": {"parts": [{"text": t} for t in texts]}}]}
+
+
+class _StandIn(BaseHTTPRequestHandler):
+	"""Serves :generateContent and :streamGenerateContent according to the server's `mode`."""
+
+	protocol_version = "HTTP/1.1"
+
+	def log_message(self, *args):
+		pass
+
+	def setup(self):
+		super().setup()
+		with self.server.lock:
+			self.server.connections += 1
+
+	def do_POST(self):
+		server = self.server
+		url = urlparse(self.path)
+		body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+		server.requests.append({"path": url.path, "query": parse_qs(url.query), "body": body})
+		mode = server.mode
+		if mode == "slow":
+			time.sleep(0.5)
+		if mode == "error":
+			return self._send(500, b'{"error": "boom"}', "application/json")
+		if mode == "not_json":
+			return self._send(200, b"<html>gateway</html>", "text/html")
+		if url.path.endswith(":streamGenerateContent"):
+			return self._stream(server)
+		self._send(200, json.dumps(_candidate("Hello", " world")).encode(), "application/json")
+
+	def _send(self, status, data, content_type):
+		try:
+			self.send_response(status)
+			self.send_header("Content-Type", content_type)
+			self.send_header("Content-Length", str(len(data)))
+			self.end_headers()
+			self.wfile.write(data)
+			self.wfile.flush()
+		except (BrokenPipeError, ConnectionResetError):
+			# The client gave up (e.g. a timeout test); drop the connection quietly
+			self.close_connection = True
+
+	def _stream(self, server):
+		self.send_response(200)
+		self.send_header("Content-Type", "text/event-stream")
+		self.send_header("Connection", "close")
+		self.end_headers()
+		self.close_connection = True
+		try:
+			for i in range(server.stream_events):
+				self.wfile.write(f"data: {json.dumps(_candidate(f'chunk{i} '))}\r\n\r\n".encode())
+				# Lines that are not data events are skipped by the client
+				self.wfile.write(b": keep-alive\r\n\r\n")
+				self.wfile.flush()
+				time.sleep(server.stream_delay)
+		except (BrokenPipeError, ConnectionResetError):
+			server.disconnected.set()
+
+
+class GeminiClientTest(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _StandIn)
+		cls.server.daemon_threads = True
+		cls.server.lock = threading.Lock()
+		cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+		cls.thread.start()
+
+	@classmethod
+	def tearDownClass(cls):
+		cls.server.shutdown()
+		cls.server.server_close()
+
+	def setUp(self):
+		self.server.mode = "ok"
+		self.server.requests = []
+		self.server.stream_events = 3
+		self.server.stream_delay = 0.0
+		self.server.disconnected = threading.Event()
+		self.server.connections = 0
+		host, port = self.server.server_address
+		self.client = GeminiClient(f"http://{host}:{port}/v1beta/models/test", api_key="test-key", pool_size=2)
+
+	def test_generate_returns_json_and_sends_preset(self):
+		result = self.client.generate("Hi there", preset="chat", name="health_chat")
+		self.assertEqual(candidate_text(result), "Hello world")
+		req = self.server.requests[-1]
+		self.assertEqual(req["path"], "/v1beta/models/test:generateContent")
+		self.assertEqual(req["query"]["key"], ["test-key"])
+		self.assertEqual(req["body"]["contents"], [{"parts": [{"text": "Hi there"}]}])
+		self.assertEqual(req["body"]["generationConfig"]["maxOutputTokens"], 1024)
+		self.assertEqual(req["body"]["safetySettings"], SAFETY_SETTINGS)
+
+	def test_generation_config_overrides_preset(self):
+		self.client.generate_text("x", preset="wellness", generation_config={"temperature": 0.2}, safety=False)
+		body = self.server.requests[-1]["body"]
+		self.assertEqual(body["generationConfig"]["temperature"], 0.2)
+		self.assertEqual(body["generationConfig"]["topP"], 0.9)
+		self.assertNotIn("safetySettings", body)
+
+	def test_connection_is_reused(self):
+		self.client.generate_text("a")
+		self.client.generate_text("b")
+		self.client.generate_text("c")
+		self.assertEqual(len(self.server.requests), 3)
+		# All three calls went over the one keep-alive connection
+		self.assertEqual(self.server.connections, 1)
+		self.assertEqual(self.client.transport, "requests")
+
+	def test_non_2xx_raises_gemini_error(self):
+		self.server.mode = "error"
+		with self.assertRaises(GeminiError) as ctx:
+			self.client.generate("x", name="wellness")
+		self.assertEqual(ctx.exception.status, 500)
+		self.assertIn("boom", ctx.exception.body)
+		self.assertEqual(self.client.stats()["calls"]["wellness"]["errors"], 1)
+
+	def test_non_json_body_raises_gemini_error(self):
+		self.server.mode = "not_json"
+		with self.assertRaises(GeminiError) as ctx:
+			self.client.generate("x")
+		self.assertEqual(ctx.exception.status, 200)
+		self.assertIn("gateway", ctx.exception.body)
+
+	def test_timeout_is_classified(self):
+		self.server.mode = "slow"
+		with self.assertRaises(GeminiError):
+			self.client.generate("x", timeout=0.1, name="slow_call")
+		stats = self.client.stats()["calls"]["slow_call"]
+		self.assertEqual(stats["statuses"], {"timeout": 1})
+		self.assertEqual(stats["errors"], 1)
+
+	def test_missing_api_key(self):
+		client = GeminiClient(self.client.model_url, api_key=None)
+		saved = os.environ.pop("GEMINI_API_KEY", None)
+		try:
+			with self.assertRaises(GeminiError):
+				client.generate("x")
+		finally:
+			if saved is not None:
+				os.environ["GEMINI_API_KEY"] = saved
+
+	def test_stream_generate_yields_deltas(self):
+		chunks = list(self.client.stream_generate("x", preset="chat", name="health_chat_stream"))
+		self.assertEqual(chunks, ["chunk0 ", "chunk1 ", "chunk2 "])
+		req = self.server.requests[-1]
+		self.assertEqual(req["path"], "/v1beta/models/test:streamGenerateContent")
+		self.assertEqual(req["query"]["alt"], ["sse"])
+		self.assertEqual(self.client.stats()["calls"]["health_chat_stream"]["statuses"], {"200": 1})
+
+	def test_stream_generate_error_raised_up_front(self):
+		self.server.mode = "error"
+		with self.assertRaises(GeminiError) as ctx:
+			self.client.stream_generate("x")
+		self.assertEqual(ctx.exception.status, 500)
+		self.assertIn("boom", ctx.exception.body)
+
+	def test_stream_close_releases_connection(self):
+		self.server.stream_events = 1000
+		self.server.stream_delay = 0.01
+		stream = self.client.stream_generate("x")
+		self.assertEqual(next(stream), "chunk0 ")
+		started = time.monotonic()
+		stream.close()
+		self.assertLess(time.monotonic() - started, 1.0)
+		with self.assertRaises(StopIteration):
+			next(stream)
+		# The server notices the client hung up long before it would finish streaming
+		self.assertTrue(self.server.disconnected.wait(5.0))
+
+
+class GeminiMetricsTest(unittest.TestCase):
+	def test_counts_and_percentiles(self):
+		metrics = GeminiMetrics(window=100)
+		for ms in range(1, 101):
+			metrics.record("chat", 200, float(ms))
+		metrics.record("chat", 429, 50.0)
+		metrics.record("chat", "timeout", 500.0)
+		snap = metrics.snapshot()["chat"]
+		self.assertEqual(snap["calls"], 102)
+		self.assertEqual(snap["errors"], 2)
+		self.assertEqual(snap["statuses"], {"200": 100, "429": 1, "timeout": 1})
+		self.assertEqual(snap["max_ms"], 500.0)
+		# Percentiles cover the last `window` calls only (3..100, 50, 500)
+		self.assertEqual(snap["p50_ms"], 52.0)
+		self.assertEqual(snap["p95_ms"], 97.0)
+
+	def test_names_are_tracked_separately(self):
+		metrics = GeminiMetrics()
+		metrics.record("a", 200, 1.0)
+		metrics.record("b", "error", 2.0)
+		snap = metrics.snapshot()
+		self.assertEqual((snap["a"]["errors"], snap["b"]["errors"]), (0, 1))
+		self.assertEqual(snap["a"]["avg_ms"], 1.0)
+
+
+if __name__ == "__main__":
+	unittest.main()